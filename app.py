@@ -24,15 +24,41 @@ Funcionalidades:
 """
 
 # Passo 1: Importação das Bibliotecas Essenciais
+import ast
+import asyncio
+import builtins
+import functools
+import hashlib
+import io
+import json
+import queue
+import re
+import shelve
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
+import polars as pl
+import matplotlib
+# Backend não interativo: as figuras só são convertidas em imagem, nunca exibidas em janela.
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
+from pyarrow import csv as pa_csv
+import fast_stats
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, get_buffer_string, messages_from_dict, messages_to_dict
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableLambda
 from langchain_core.chat_history import InMemoryChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_experimental.agents.agent_toolkits import create_pandas_dataframe_agent
+from langchain_experimental.tools.python.tool import PythonAstREPLTool, sanitize_input
+from pydantic import PrivateAttr
 
 # ==============================================================================
 # CONSTANTES E CONFIGURAÇÕES GLOBAIS
@@ -59,14 +85,129 @@ Você é um analista de dados e especialista em Python, Pandas, Matplotlib e Sea
 - Caso não saiba a informação solicitada, responda: "Não sei informar o que você pediu. Estou pronto para sua próxima pergunta ou instrução."
 - Após gerar um gráfico, forneça também uma breve explicação textual sobre o que o gráfico representa.
 - Não mostre o código Python gerado, a menos que seja explicitamente solicitado. Apresente apenas o resultado (texto, tabelas ou gráficos).
+- Para estatísticas numéricas em colunas grandes, prefira `fast_stats.iqr_outliers`/`pairwise_corr` (Numba JIT) em vez de `df.describe()`/`df.corr()`. Importe o módulo com `import fast_stats`; `fast_stats.describe_fast(df['coluna'])` substitui `df['coluna'].describe()`.
+- Para datasets grandes, prefira `pl_df.select(...)` / `pl_df.group_by(...)` (Polars) em vez de `df.groupby` — equivalente mas mais rápido. A variável `pl_df` contém os mesmos dados de `df` e o módulo Polars está disponível como `pl`. Para gráficos, continue usando o `df` do Pandas.
+- Prefira sempre vetorização com operações de coluna em vez de `apply` por linha. Em `rolling.apply` com uma função puramente numérica, passe `raw=True, engine='numba', engine_kwargs={'nopython': True, 'nogil': True, 'parallel': True}`. Nunca use `engine='numba'` em `df.apply`: as colunas do `df` usam tipos Arrow e a compilação falha. Para cálculos por linha que não possam ser vetorizados, converta antes as colunas numéricas com `df[colunas].to_numpy('float64')` e opere sobre o array NumPy, ou use as funções de `fast_stats`.
 - Seja um analista de dados crítico e detalhista.
 - Responda sempre em português, não traga respostas em inglês.
 """
 
-# O armazenamento do histórico de chat é um dicionário global simples.
-# Isso funciona bem para o modelo de execução do Streamlit, onde cada sessão de usuário
-# tem seu próprio processo, mas não persistirá se o servidor for reiniciado.
-store = {}
+# Número máximo de linhas entregues ao agente. Arquivos maiores são analisados
+# a partir de uma amostra aleatória, o que mantém rápido o código gerado pelo agente.
+AGENT_SAMPLE_SIZE = 50_000
+
+# Instrução adicionada à persona quando o agente recebe uma amostra dos dados.
+SAMPLE_NOTE = "- O DataFrame `df` é uma amostra aleatória representativa de {sample_rows} linhas de um total de {total_rows}; estatísticas devem ser interpretadas como estimativas.\n"
+
+# Final do prompt do agente, após a persona e as instruções de uso das ferramentas.
+# Inclui o histórico da conversa (em texto) para permitir perguntas de acompanhamento.
+AGENT_SUFFIX = """Histórico da conversa até aqui:
+{chat_history}
+
+Begin!
+Question: {input}
+{agent_scratchpad}"""
+
+# Marcador que, no formato ReAct usado pelo agente, antecede a resposta final.
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+# Separa uma pergunta composta em subperguntas: quebra logo após cada "?"
+# e em cada quebra de linha.
+SUBQUESTION_SPLIT_PATTERN = re.compile(r"(?<=\?)|\n")
+# Subperguntas que podem gerar gráficos: o estado de figuras do pyplot é global,
+# então elas não podem ser executadas em paralelo.
+PLOT_QUESTION_PATTERN = re.compile(
+    r"gr[áa]fic|plot|histograma|boxplot|dispers[ãa]o|visualiz|barras|pizza|heatmap|mapa\s+de\s+calor",
+    re.I,
+)
+# Subperguntas que retomam a resposta de uma anterior ("Faça um histograma dela").
+BACK_REFERENCE_PATTERN = re.compile(
+    r"\b(?:del[ae]s?|dess[ae]s?|dest[ae]s?|diss[oa]|dist[oa]|nel[ae]s?|ness[ae]s?|"
+    r"ess[ae]s?|est[ae]s?|iss[oa]|ist[oa]|aquel[ae]s?|anterior(?:es)?|acima|mesm[ao]s?)\b"
+    r"|-(?:l?[ao]s?)\b",
+    re.I,
+)
+
+# Perguntas sobre a estrutura dos dados que são respondidas localmente, a partir
+# do próprio DataFrame, sem uma chamada ao LLM. Cada padrão identifica um assunto.
+DTYPES_PATTERN = re.compile(r"tipos?\s+de\s+dados", re.I)
+MISSING_PATTERN = re.compile(r"ausentes?|faltantes?|nul", re.I)
+DUPLICATES_PATTERN = re.compile(r"dup+licad", re.I)
+ROW_COUNT_PATTERN = re.compile(r"quantas?\s+linhas", re.I)
+
+# Para ser respondida localmente, a pergunta inteira deve ser composta apenas por
+# estas palavras; qualquer outra (um cálculo, um nome de coluna, um número, um
+# operador) indica uma pergunta mais elaborada, que segue para o agente.
+SCHEMA_QUESTION_WORDS = frozenset("""
+    qual quais quantas quantos são sao é e ou os as o a um uma de do da dos das
+    no na nos nas em há ha existe existem existes tem têm possui possuem algum
+    alguma alguns algumas tipo tipos dado dados numéricos numericos categóricos
+    categoricos etc valor valores ausente ausentes faltante faltantes nulo nulos
+    null linha linhas registros duplicado duplicados duplicada duplicadas
+    dupplicados coluna colunas cada por conjunto arquivo dataset dataframe
+""".split())
+# Separa a pergunta em palavras e símbolos; a pontuação comum é ignorada.
+QUESTION_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s?.,!:;()]")
+
+# Número máximo de históricos de chat mantidos em memória ao mesmo tempo.
+MAX_SESSIONS_IN_MEMORY = 128
+
+# Tamanho máximo (em caracteres) do histórico de uma sessão; acima disso, as
+# mensagens mais antigas são resumidas para limitar o prompt enviado ao modelo.
+MAX_HISTORY_CHARS = 8000
+
+# Instrução usada para resumir a parte mais antiga do histórico.
+HISTORY_SUMMARY_PROMPT = (
+    "Resuma concisamente, em português, a conversa abaixo entre um usuário e um "
+    "analista de dados, preservando as perguntas feitas, as colunas citadas e as "
+    "conclusões obtidas:\n\n"
+)
+
+# Arquivo (shelve) onde os históricos de chat são persistidos em disco.
+CHAT_STORE_PATH = "chat_store.db"
+
+# Tempo (em segundos) sem atualização após o qual um histórico é removido do disco.
+CHAT_STORE_MAX_AGE = 24 * 60 * 60
+
+# Intervalo mínimo (em segundos) entre duas limpezas do arquivo de históricos.
+CHAT_STORE_PRUNE_INTERVAL = 10 * 60
+
+# Chave do arquivo de históricos com o horário da última atualização de cada
+# sessão, para que a limpeza não precise carregar as conversas gravadas.
+CHAT_STORE_INDEX_KEY = "__updated__"
+
+# O armazenamento do histórico de chat em memória é um cache LRU: quando passa de
+# MAX_SESSIONS_IN_MEMORY sessões, a menos usada recentemente é descartada. Cada
+# histórico também é gravado em disco (CHAT_STORE_PATH) após cada resposta, então
+# uma sessão ainda ativa cujo histórico saiu da memória o recupera do disco.
+# O ID da sessão vive em st.session_state, que é perdido ao recarregar a página
+# ou reiniciar o servidor; por isso os históricos não sobrevivem a esses eventos
+# e os registros em disco sem atualização há mais de CHAT_STORE_MAX_AGE são
+# removidos. As sessões do Streamlit rodam em threads distintas, daí os locks:
+# store_lock protege apenas o dicionário em memória, e o acesso ao disco, mais
+# lento, é feito fora dele, sob chat_store_lock.
+store = OrderedDict()
+store_lock = threading.Lock()
+chat_store_lock = threading.Lock()
+# Horário da última limpeza do arquivo de históricos (ver prune_chat_store).
+chat_store_pruned_at = 0.0
+
+# Cache LRU das saídas do python_repl_ast, para que consultas repetidas
+# (ex.: `df.describe()`) sejam respondidas sem reexecutar o código. A chave
+# inclui a sessão, a ferramenta e a sua geração (ver CachedPythonAstREPLTool),
+# que muda sempre que um código capaz de alterar as variáveis é executado.
+REPL_CACHE_SIZE = 256
+repl_cache = OrderedDict()
+repl_cache_lock = threading.Lock()
+
+# Nomes que uma expressão pode referenciar para ter sua saída cacheada: o
+# DataFrame, módulos comuns e funções nativas. Variáveis criadas pelo próprio
+# agente podem mudar entre chamadas e impedem o cache.
+CACHEABLE_NAMES = {"df", "pl_df", "pd", "pl", "np", "fast_stats"} | set(dir(builtins))
+# Código que gera gráficos ou altera o DataFrame precisa ser sempre executado.
+UNCACHEABLE_CODE_PATTERN = re.compile(
+    r"plt\.|sns\.|\.plot|\.hist|\.boxplot|inplace|print\(|\.(pop|insert|update)\(|setattr\("
+)
 
 # ==============================================================================
 # FUNÇÕES AUXILIARES E DE LÓGICA
@@ -85,21 +226,90 @@ def get_llm(google_api_key):
     Returns:
         ChatGoogleGenerativeAI: Uma instância do modelo de linguagem pronto para uso.
     """
+    # Compila antecipadamente os kernels Numba do fast_stats, para que a
+    # compilação JIT não aconteça durante a primeira pergunta do usuário.
+    fast_stats.warmup()
+
     return ChatGoogleGenerativeAI(
         model="gemini-2.5-flash",
         google_api_key=google_api_key,
         # Temperatura 0 para respostas mais determinísticas e factuais,
         # ideal para análise de dados onde a precisão é crucial.
         temperature=0,
+        # Streaming habilitado para que a resposta seja exibida à medida que
+        # é gerada, reduzindo o tempo até o primeiro conteúdo na tela.
+        streaming=True,
         convert_system_message_to_human=True
     )
 
-@st.cache_data
+def optimize_dtypes(df):
+    """
+    Reduz o consumo de memória do DataFrame ajustando os tipos das colunas.
+    Colunas de texto passam a usar `string[pyarrow]` e colunas numéricas são
+    convertidas para o menor tipo que comporta seus valores (ex.: float32,
+    int16), o que acelera as operações que o agente executa sobre `df`.
+
+    Args:
+        df (pd.DataFrame): O DataFrame recém-carregado.
+
+    Returns:
+        pd.DataFrame: O DataFrame com os tipos otimizados.
+    """
+    df = df.convert_dtypes(dtype_backend="pyarrow")
+    for column in df.select_dtypes("float").columns:
+        df[column] = pd.to_numeric(df[column], downcast="float")
+    for column in df.select_dtypes("integer").columns:
+        df[column] = pd.to_numeric(df[column], downcast="integer")
+    return df
+
+def _read_bytes(f):
+    """Lê todo o conteúdo do arquivo, deixando o cursor no início para outros leitores."""
+    f.seek(0)
+    b = f.read()
+    f.seek(0)
+    return b
+
+def file_sha1(uploaded_file):
+    """
+    Calcula o SHA-1 do conteúdo do arquivo carregado, que identifica o arquivo
+    nos caches da aplicação. O resultado é memorizado na sessão pelo `file_id`
+    do upload, para que o conteúdo não seja hasheado novamente a cada rerun.
+
+    Args:
+        uploaded_file: O objeto de arquivo carregado via Streamlit.
+
+    Returns:
+        str: O SHA-1 do conteúdo, em hexadecimal.
+    """
+    digests = st.session_state.setdefault("file_sha1", {})
+    if uploaded_file.file_id not in digests:
+        # getbuffer() expõe o conteúdo em memória do upload sem copiá-lo.
+        digests[uploaded_file.file_id] = hashlib.sha1(uploaded_file.getbuffer()).hexdigest()
+    return digests[uploaded_file.file_id]
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def _parse_csv(sha: str, _source) -> pd.DataFrame:
+    """
+    Converte o conteúdo de um arquivo CSV em DataFrame.
+    A chave do cache é apenas o SHA-1 do conteúdo (o prefixo "_" impede o
+    Streamlit de hashear o arquivo), de modo que todas as sessões que
+    carregarem o mesmo arquivo compartilham um único DataFrame processado.
+    Os bytes do arquivo só são lidos quando o resultado não está em cache.
+    A leitura usa o leitor CSV do PyArrow, que é multithread e mantém os dados
+    em buffers Arrow (pd.ArrowDtype), evitando criar um objeto Python por célula.
+    """
+    table = pa_csv.read_csv(
+        io.BytesIO(_read_bytes(_source)),
+        read_options=pa_csv.ReadOptions(use_threads=True, block_size=2**22),
+    )
+    df = table.to_pandas(types_mapper=pd.ArrowDtype, self_destruct=True)
+    return optimize_dtypes(df)
+
 def load_csv(uploaded_file):
     """
     Carrega o arquivo CSV enviado pelo usuário em um DataFrame do Pandas.
-    O cache (@st.cache_data) evita recarregar e processar o mesmo arquivo a
-    cada pergunta, melhorando a performance da aplicação.
+    O processamento é cacheado pelo conteúdo do arquivo (ver `_parse_csv`),
+    evitando recarregar o mesmo arquivo a cada pergunta.
 
     Args:
         uploaded_file: O objeto de arquivo carregado via Streamlit.
@@ -108,26 +318,189 @@ def load_csv(uploaded_file):
         pd.DataFrame or None: O DataFrame carregado ou None em caso de erro.
     """
     try:
-        return pd.read_csv(uploaded_file)
+        return _parse_csv(file_sha1(uploaded_file), uploaded_file)
     except Exception as e:
         st.error(f"Erro ao carregar o arquivo CSV: {e}")
         return None
 
-def get_session_history(session_id: str):
+class SummarizingChatMessageHistory(InMemoryChatMessageHistory):
+    """
+    Histórico de chat em memória com tamanho limitado. Quando o texto das
+    mensagens passa de `max_chars`, `compact` resume a metade mais antiga pelo
+    LLM em uma única mensagem de sistema, o que limita o tamanho (e a latência)
+    do prompt reenviado ao modelo a cada pergunta. O resumo não é feito em
+    `add_message`, que roda ao fim de cada resposta, e sim depois dela, em
+    segundo plano (ver schedule_history_compaction).
+    """
+
+    llm: Any = None
+    max_chars: int = MAX_HISTORY_CHARS
+    _compact_lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def compact(self):
+        """
+        Resume a metade mais antiga das mensagens se o histórico passou de
+        `max_chars`. Se o resumo falhar, o histórico completo é mantido.
+
+        Returns:
+            bool: True se o histórico foi resumido.
+        """
+        if self.llm is None or len(self.messages) < 2:
+            return False
+        if sum(len(str(m.content)) for m in self.messages) <= self.max_chars:
+            return False
+        # Apenas um resumo por vez para o mesmo histórico.
+        if not self._compact_lock.acquire(blocking=False):
+            return False
+        try:
+            half = len(self.messages) // 2
+            older = self.messages[:half]
+            try:
+                summary = self.llm.invoke(HISTORY_SUMMARY_PROMPT + get_buffer_string(older))
+            except Exception:
+                return False
+            # Novas mensagens podem ter chegado durante o resumo; ele só é
+            # aplicado se as mensagens resumidas continuam no início do histórico.
+            if self.messages[:half] != older:
+                return False
+            self.messages = [
+                SystemMessage(content=f"Resumo da conversa anterior: {summary.content}")
+            ] + self.messages[half:]
+            return True
+        finally:
+            self._compact_lock.release()
+
+def get_session_history(session_id: str, llm=None):
     """
     Obtém ou cria um histórico de chat para uma sessão específica.
-    Utiliza o dicionário global 'store' para manter históricos separados
-    para cada sessão de usuário.
+    Utiliza o cache LRU global 'store' para manter históricos separados
+    para cada sessão de usuário; se a sessão não estiver em memória, o
+    histórico é recarregado do disco, quando existir.
 
     Args:
         session_id (str): O identificador único da sessão de chat.
+        llm: O modelo usado para resumir o histórico quando ele fica longo.
 
     Returns:
-        InMemoryChatMessageHistory: O objeto de histórico da sessão.
+        SummarizingChatMessageHistory: O objeto de histórico da sessão.
     """
-    if session_id not in store:
-        store[session_id] = InMemoryChatMessageHistory()
-    return store[session_id]
+    with store_lock:
+        history = store.get(session_id)
+        if history is not None:
+            store.move_to_end(session_id)
+
+    if history is None:
+        messages = load_session_messages(session_id)
+        with store_lock:
+            # Outra thread pode ter criado o histórico enquanto o disco era lido.
+            history = store.get(session_id)
+            if history is None:
+                history = SummarizingChatMessageHistory(messages=messages)
+                store[session_id] = history
+                if len(store) > MAX_SESSIONS_IN_MEMORY:
+                    store.popitem(last=False)
+
+    if llm is not None:
+        history.llm = llm
+    return history
+
+def load_session_messages(session_id: str):
+    """
+    Lê do disco as mensagens gravadas de uma sessão.
+
+    Args:
+        session_id (str): O identificador único da sessão de chat.
+
+    Returns:
+        list: As mensagens da sessão, ou uma lista vazia se não houver registro.
+    """
+    with chat_store_lock, shelve.open(CHAT_STORE_PATH) as db:
+        # Uma nova sessão em memória é um bom momento para limpar o disco.
+        prune_chat_store(db)
+        return messages_from_dict(db[session_id]) if session_id in db else []
+
+def prune_chat_store(db):
+    """
+    Remove do disco os históricos sem atualização há mais de CHAT_STORE_MAX_AGE,
+    mantendo limitado o tamanho do arquivo de históricos. A limpeza roda no
+    máximo uma vez a cada CHAT_STORE_PRUNE_INTERVAL e consulta apenas o índice
+    de horários (CHAT_STORE_INDEX_KEY), sem carregar as conversas.
+
+    Args:
+        db (shelve.Shelf): O arquivo de históricos, já aberto sob chat_store_lock.
+    """
+    global chat_store_pruned_at
+    now = time.time()
+    if now - chat_store_pruned_at < CHAT_STORE_PRUNE_INTERVAL:
+        return
+    chat_store_pruned_at = now
+
+    cutoff = now - CHAT_STORE_MAX_AGE
+    updated = db.get(CHAT_STORE_INDEX_KEY, {})
+    # Registros fora do índice (ex.: de um formato anterior) também são removidos.
+    for session_id in list(db.keys()):
+        if session_id != CHAT_STORE_INDEX_KEY and updated.get(session_id, 0) < cutoff:
+            del db[session_id]
+    db[CHAT_STORE_INDEX_KEY] = {
+        session_id: timestamp
+        for session_id, timestamp in updated.items()
+        if session_id in db
+    }
+
+def save_session_history(session_id: str):
+    """
+    Grava em disco o histórico de chat de uma sessão que está em memória.
+
+    Args:
+        session_id (str): O identificador único da sessão de chat.
+    """
+    with store_lock:
+        history = store.get(session_id)
+        if history is None:
+            return
+        messages = messages_to_dict(history.messages)
+
+    with chat_store_lock, shelve.open(CHAT_STORE_PATH) as db:
+        db[session_id] = messages
+        updated = db.get(CHAT_STORE_INDEX_KEY, {})
+        updated[session_id] = time.time()
+        db[CHAT_STORE_INDEX_KEY] = updated
+
+def schedule_history_compaction(session_id: str):
+    """
+    Resume, em uma thread auxiliar, o histórico de uma sessão que ficou longo
+    e grava o resultado em disco. Assim a chamada ao LLM para o resumo não
+    atrasa a resposta exibida ao usuário.
+
+    Args:
+        session_id (str): O identificador único da sessão de chat.
+    """
+    with store_lock:
+        history = store.get(session_id)
+    if history is None:
+        return
+
+    def compact():
+        if history.compact():
+            save_session_history(session_id)
+
+    threading.Thread(target=compact, daemon=True).start()
+
+def delete_session_history(session_id: str):
+    """
+    Remove o histórico de chat de uma sessão da memória e do disco.
+
+    Args:
+        session_id (str): O identificador único da sessão de chat.
+    """
+    with store_lock:
+        store.pop(session_id, None)
+
+    with chat_store_lock, shelve.open(CHAT_STORE_PATH) as db:
+        db.pop(session_id, None)
+        updated = db.get(CHAT_STORE_INDEX_KEY, {})
+        if updated.pop(session_id, None) is not None:
+            db[CHAT_STORE_INDEX_KEY] = updated
 
 def initialize_session_state():
     """
@@ -138,8 +511,8 @@ def initialize_session_state():
     if "messages" not in st.session_state:
         st.session_state.messages = []
     if "session_id" not in st.session_state:
-        # Cria um ID de sessão único baseado no timestamp atual.
-        st.session_state.session_id = f"session_{pd.Timestamp.now().timestamp()}"
+        # Cria um ID de sessão único e aleatório.
+        st.session_state.session_id = uuid.uuid4().hex
 
 def clear_chat_history():
     """
@@ -147,35 +520,167 @@ def clear_chat_history():
     Força a criação de um novo ID de sessão para efetivamente "esquecer"
     a conversa anterior.
     """
+    # Descarta o histórico da sessão atual, que não será mais usado.
+    previous_session_id = st.session_state.session_id
+    delete_session_history(previous_session_id)
     # Gera um novo ID de sessão para "esquecer" o histórico anterior
-    st.session_state.session_id = f"session_{pd.Timestamp.now().timestamp()}"
+    st.session_state.session_id = uuid.uuid4().hex
     st.session_state.messages = []
+    clear_repl_cache(previous_session_id)
     if 'df_loaded' in st.session_state:
         del st.session_state['df_loaded']
     st.success("A conversa foi reiniciada!")
 
-def initialize_agent(llm, df):
+@st.cache_data(max_entries=4, show_spinner=False)
+def summarize_df(sha: str, _df) -> str:
+    """
+    Gera um resumo compacto do DataFrame (prévia, tipos e dimensões) para o
+    prompt do agente. É calculado uma única vez por arquivo (chave: SHA-1 do
+    conteúdo), de modo que reenvios do mesmo arquivo reaproveitam o resumo.
+
+    Args:
+        sha (str): O SHA-1 do conteúdo do arquivo.
+        _df (pd.DataFrame): O DataFrame entregue ao agente.
+
+    Returns:
+        str: O resumo em formato JSON.
+    """
+    summary = {
+        "head": _df.head(5).to_markdown(),
+        "dtypes": _df.dtypes.astype(str).to_dict(),
+        "shape": _df.shape,
+    }
+    return json.dumps(summary, ensure_ascii=False)
+
+def format_chat_history(inputs):
+    """
+    Converte o histórico de mensagens em texto ("Human: ...", "AI: ..."), o
+    formato esperado pelo prompt do agente.
+
+    Args:
+        inputs (dict): A entrada do agente, com a lista de mensagens em "chat_history".
+
+    Returns:
+        dict: A mesma entrada, com o histórico já formatado.
+    """
+    return {**inputs, "chat_history": get_buffer_string(inputs["chat_history"])}
+
+def is_cacheable_code(code: str) -> bool:
+    """
+    Indica se a saída de um código do python_repl_ast pode ser reaproveitada.
+    Só são cacheadas expressões únicas, sem efeitos colaterais conhecidos, que
+    referenciam apenas o DataFrame, módulos comuns e funções nativas.
+
+    Args:
+        code (str): O código a ser executado pela ferramenta.
+
+    Returns:
+        bool: True se a saída do código pode ser cacheada.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False
+    if len(tree.body) != 1 or not isinstance(tree.body[0], ast.Expr):
+        return False
+    if UNCACHEABLE_CODE_PATTERN.search(code):
+        return False
+    return all(
+        node.id in CACHEABLE_NAMES
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Name)
+    )
+
+class CachedPythonAstREPLTool(PythonAstREPLTool):
+    """
+    Ferramenta `python_repl_ast` que memoriza a saída (em texto) de consultas
+    repetidas no cache global 'repl_cache'. O código que não pode ser cacheado
+    (ver `is_cacheable_code`) é executado normalmente e, como pode ter alterado
+    o `df` ou outras variáveis (ex.: `df['a'] = 0`), avança a geração da
+    ferramenta, invalidando as saídas cacheadas até então.
+    """
+
+    session_id: str = ""
+    # Identificador único da ferramenta: ao contrário de id(self), não é
+    # reaproveitado por outra ferramenta depois que esta é coletada.
+    _token: str = PrivateAttr(default_factory=lambda: uuid.uuid4().hex)
+    _generation: int = PrivateAttr(default=0)
+
+    def _run(self, query, run_manager=None):
+        code = sanitize_input(query) if self.sanitize_input else query
+        if not is_cacheable_code(code):
+            try:
+                return super()._run(query, run_manager)
+            finally:
+                self._generation += 1
+
+        key = (self.session_id, self._token, self._generation, code)
+        with repl_cache_lock:
+            if key in repl_cache:
+                repl_cache.move_to_end(key)
+                return repl_cache[key]
+
+        output = str(super()._run(query, run_manager))
+        with repl_cache_lock:
+            repl_cache[key] = output
+            if len(repl_cache) > REPL_CACHE_SIZE:
+                repl_cache.popitem(last=False)
+        return output
+
+def clear_repl_cache(session_id: str):
+    """
+    Remove do cache 'repl_cache' as saídas das ferramentas de uma sessão.
+
+    Args:
+        session_id (str): O identificador único da sessão de chat.
+    """
+    with repl_cache_lock:
+        for key in [key for key in repl_cache if key[0] == session_id]:
+            del repl_cache[key]
+
+@st.cache_resource(max_entries=MAX_SESSIONS_IN_MEMORY, hash_funcs={ChatGoogleGenerativeAI: id})
+def initialize_agent(llm, _df, file_sha, session_id):
     """
     Cria e configura o agente LangChain para análise de DataFrame.
+    O cache (@st.cache_resource) evita reconstruir o agente a cada rerun do
+    Streamlit: ele é criado uma única vez por sessão e arquivo carregado.
+    O DataFrame não é usado como chave do cache (prefixo "_"); quem identifica
+    o arquivo é o SHA-1 do seu conteúdo. O agente não é compartilhado entre
+    sessões: o código que ele executa pode alterar o `df` e criar variáveis,
+    e isso não deve afetar a análise de outros usuários.
 
     Args:
         llm: A instância do modelo de linguagem (LLM).
-        df (pd.DataFrame): O DataFrame a ser analisado.
+        _df (pd.DataFrame): O DataFrame completo do arquivo. Se tiver mais de
+            AGENT_SAMPLE_SIZE linhas, o agente recebe uma amostra aleatória e é
+            avisado disso; a amostragem só ocorre quando o agente é criado.
+        file_sha (str): O SHA-1 do conteúdo do arquivo carregado.
+        session_id (str): O identificador da sessão de chat dona do agente.
 
     Returns:
         RunnableWithMessageHistory: O agente configurado com memória.
     """
-    prompt_template = ChatPromptTemplate.from_messages([
-        ("system", AGENT_PERSONA),
-        MessagesPlaceholder(variable_name="chat_history"),
-        ("human", "{input}"),
-        MessagesPlaceholder(variable_name="agent_scratchpad"),
-    ])
+    sample_note = ""
+    if len(_df) > AGENT_SAMPLE_SIZE:
+        df_agent = _df.sample(n=AGENT_SAMPLE_SIZE, random_state=0)
+        sample_note = SAMPLE_NOTE.format(sample_rows=len(df_agent), total_rows=len(_df))
+    else:
+        df_agent = _df
+
+    prefix = (
+        AGENT_PERSONA + sample_note
+        + "\nInformações do DataFrame:\n" + summarize_df(file_sha, df_agent)
+    )
 
     agent = create_pandas_dataframe_agent(
         llm=llm,
-        df=df,
-        prompt=prompt_template,
+        df=df_agent,
+        # A persona e o resumo pré-calculado do DataFrame abrem o prompt. Como o
+        # prefixo é um template, as chaves do texto (ex.: do JSON) são escapadas.
+        prefix=prefix.replace("{", "{{").replace("}", "}}"),
+        # Com um sufixo próprio, o LangChain não gera a sua prévia com df.head().
+        suffix=AGENT_SUFFIX,
+        include_df_in_prompt=None,
         verbose=False,  # Mantido como False para uma UI limpa.
         # ATENÇÃO: Habilitar código perigoso é necessário para que o agente execute
         # código Python gerado por ele mesmo. Use isso com cautela, idealmente em
@@ -186,9 +691,21 @@ def initialize_agent(llm, df):
         agent_executor_kwargs={"handle_parsing_errors": True}
     )
 
+    # Substitui a ferramenta python_repl_ast criada pelo LangChain pela versão
+    # com cache. As variáveis da ferramenta são próprias desta sessão: uma cópia
+    # do `df` e uma cópia Polars dos dados (`pl_df`) para análises pesadas.
+    session_locals = {"df": df_agent.copy(), "pl_df": pl.from_pandas(df_agent), "pl": pl}
+    agent.tools = [
+        CachedPythonAstREPLTool(
+            session_id=session_id, locals=session_locals, globals=dict(tool.globals)
+        )
+        if isinstance(tool, PythonAstREPLTool) else tool
+        for tool in agent.tools
+    ]
+
     return RunnableWithMessageHistory(
-        agent,
-        get_session_history,
+        RunnableLambda(format_chat_history) | agent,
+        functools.partial(get_session_history, llm=llm),
         input_messages_key="input",
         history_messages_key="chat_history",
     )
@@ -238,12 +755,192 @@ def render_sidebar():
         )
     return google_api_key, uploaded_file
 
-def handle_chat_interaction(agent_with_memory):
+def figure_to_png(fig, dpi=90):
+    """
+    Converte uma figura Matplotlib em uma imagem PNG.
+    Guardar os bytes da imagem no histórico, em vez do objeto Figure, torna a
+    re-exibição a cada rerun bem mais barata (st.image não precisa renderizar
+    a figura novamente).
+
+    Args:
+        fig (matplotlib.figure.Figure): A figura a ser convertida.
+        dpi (int): A resolução da imagem gerada.
+
+    Returns:
+        bytes: O conteúdo da imagem PNG.
+    """
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi, bbox_inches="tight")
+    return buffer.getvalue()
+
+def split_compound_prompt(prompt: str) -> list[str]:
+    """
+    Divide uma pergunta composta em subperguntas independentes.
+    Só há divisão quando o texto contém ao menos dois pontos de interrogação;
+    caso contrário, a pergunta é devolvida inteira.
+
+    Args:
+        prompt (str): A pergunta do usuário.
+
+    Returns:
+        list[str]: As subperguntas encontradas, na ordem em que aparecem.
+    """
+    if prompt.count("?") < 2:
+        return [prompt]
+    subquestions = [part.strip() for part in SUBQUESTION_SPLIT_PATTERN.split(prompt)]
+    return [part for part in subquestions if part]
+
+def can_answer_in_parallel(subquestions: list[str]) -> bool:
+    """
+    Indica se as subperguntas podem ser enviadas ao agente em paralelo. Isso só
+    acontece quando nenhuma delas pode gerar um gráfico e nenhuma retoma a
+    resposta de uma subpergunta anterior.
+
+    Args:
+        subquestions (list[str]): As subperguntas, na ordem em que aparecem.
+
+    Returns:
+        bool: True se as subperguntas são independentes entre si.
+    """
+    if any(PLOT_QUESTION_PATTERN.search(question) for question in subquestions):
+        return False
+    return not any(BACK_REFERENCE_PATTERN.search(question) for question in subquestions[1:])
+
+def try_local_answer(prompt: str, df) -> str | None:
+    """
+    Responde localmente perguntas simples sobre a estrutura dos dados (tipos,
+    dados ausentes, duplicados e número de linhas), evitando uma chamada ao LLM.
+    Só há resposta local quando cada subpergunta do prompt é formada apenas por
+    palavras de SCHEMA_QUESTION_WORDS e trata de ao menos um desses assuntos;
+    todos os assuntos citados em cada subpergunta são respondidos.
+
+    Args:
+        prompt (str): A pergunta do usuário.
+        df (pd.DataFrame): O DataFrame carregado.
+
+    Returns:
+        str or None: A resposta em Markdown, ou None se a pergunta deve ir ao agente.
+    """
+    sections = []
+    for question in split_compound_prompt(prompt):
+        tokens = QUESTION_TOKEN_PATTERN.findall(question.lower())
+        if not all(token in SCHEMA_QUESTION_WORDS for token in tokens):
+            return None
+
+        answered = False
+        if DTYPES_PATTERN.search(question):
+            dtypes = df.dtypes.astype(str).rename("Tipo").rename_axis("Coluna")
+            sections.append("**Tipos de dados por coluna:**\n\n" + dtypes.to_frame().to_markdown())
+            answered = True
+        if MISSING_PATTERN.search(question):
+            missing = df.isna().sum()
+            missing = missing[missing > 0]
+            if missing.empty:
+                sections.append("Não há dados ausentes no conjunto de dados.")
+            else:
+                missing = missing.rename("Ausentes").rename_axis("Coluna")
+                sections.append("**Dados ausentes por coluna:**\n\n" + missing.to_frame().to_markdown())
+            answered = True
+        if DUPLICATES_PATTERN.search(question):
+            duplicates = int(df.duplicated().sum())
+            if duplicates == 1:
+                sections.append("Há 1 linha duplicada no conjunto de dados.")
+            elif duplicates:
+                sections.append(f"Há {duplicates} linhas duplicadas no conjunto de dados.")
+            else:
+                sections.append("Não há linhas duplicadas no conjunto de dados.")
+            answered = True
+        # "Quantas linhas duplicadas?" já é respondida acima, pelos duplicados.
+        if ROW_COUNT_PATTERN.search(question) and not answered:
+            sections.append(f"O conjunto de dados possui {len(df)} linhas e {df.shape[1]} colunas.")
+            answered = True
+        if not answered:
+            return None
+
+    return "\n\n".join(sections)
+
+class FinalAnswerStreamHandler(BaseCallbackHandler):
+    """
+    Callback que recebe os tokens gerados pelo LLM e coloca em uma fila apenas
+    os que vêm depois de FINAL_ANSWER_MARKER. Os pensamentos e as chamadas de
+    ferramenta do agente, gerados antes do marcador, não são exibidos.
+    """
+
+    def __init__(self, tokens: queue.Queue):
+        self.tokens = tokens
+        self.run_text = {}
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        # O texto é acumulado por chamada ao LLM, pois o marcador pode chegar
+        # dividido entre vários tokens.
+        previous = self.run_text.get(run_id, "")
+        current = previous + token
+        self.run_text[run_id] = current
+        position = current.find(FINAL_ANSWER_MARKER)
+        if position != -1:
+            piece = current[max(position + len(FINAL_ANSWER_MARKER), len(previous)):]
+            if piece:
+                self.tokens.put(piece)
+
+def stream_agent_output(agent_with_memory, prompt, config, result):
+    """
+    Executa o agente e repassa os tokens da resposta final à medida que o LLM
+    os gera. O agente roda em uma thread auxiliar enquanto este gerador consome
+    a fila preenchida pelo FinalAnswerStreamHandler. Se nenhum token for
+    transmitido (ex.: resposta fora do formato esperado), a saída final do
+    agente é devolvida de uma só vez.
+
+    Args:
+        agent_with_memory: O agente LangChain com memória.
+        prompt (str): A pergunta do usuário.
+        config (dict): A configuração da execução (ID da sessão).
+        result (dict): Recebe a saída final do agente na chave "output", que
+            pode diferir do texto transmitido (ver handle_chat_interaction).
+
+    Yields:
+        str: Trechos do texto de resposta do agente.
+    """
+    tokens = queue.Queue()
+
+    def run_agent():
+        try:
+            response = agent_with_memory.invoke(
+                {"input": prompt},
+                config={**config, "callbacks": [FinalAnswerStreamHandler(tokens)]},
+            )
+            result["output"] = response["output"]
+        except Exception as e:
+            result["error"] = e
+        finally:
+            # Sinaliza ao gerador que a execução terminou.
+            tokens.put(None)
+
+    worker = threading.Thread(target=run_agent, daemon=True)
+    worker.start()
+
+    streamed = False
+    while (piece := tokens.get()) is not None:
+        if not streamed:
+            # Remove o espaço que segue o marcador no início da resposta.
+            piece = piece.lstrip()
+            if not piece:
+                continue
+        streamed = True
+        yield piece
+    worker.join()
+
+    if "error" in result:
+        raise result["error"]
+    if not streamed:
+        yield result["output"]
+
+def handle_chat_interaction(agent_with_memory, df):
     """
     Gerencia a entrada do usuário, a invocação do agente e a exibição da resposta.
 
     Args:
         agent_with_memory: O agente LangChain com memória.
+        df (pd.DataFrame): O DataFrame carregado, usado nas respostas locais.
     """
     if prompt := st.chat_input("Faça sua pergunta sobre os dados..."):
         st.session_state.messages.append(HumanMessage(content=prompt))
@@ -251,28 +948,88 @@ def handle_chat_interaction(agent_with_memory):
             st.markdown(prompt)
 
         with st.chat_message("assistant"):
+            # Perguntas simples sobre a estrutura dos dados não precisam do LLM.
+            local_answer = try_local_answer(prompt, df)
+            if local_answer is not None:
+                st.markdown(local_answer)
+                # Registra a troca no histórico do agente para manter o contexto.
+                history = get_session_history(st.session_state.session_id)
+                history.add_user_message(prompt)
+                history.add_ai_message(local_answer)
+                save_session_history(st.session_state.session_id)
+                schedule_history_compaction(st.session_state.session_id)
+                st.session_state.messages.append(AIMessage(content=local_answer))
+                return
+
             with st.spinner("Analisando os dados e gerando a resposta..."):
                 try:
-                    # Limpa qualquer figura Matplotlib anterior para evitar sobreposição
-                    # de gráficos entre diferentes perguntas.
-                    plt.clf()
+                    # Fecha qualquer figura Matplotlib anterior para evitar sobreposição
+                    # de gráficos entre diferentes perguntas e liberar sua memória.
+                    plt.close('all')
                     
                     config = {"configurable": {"session_id": st.session_state.session_id}}
-                    response = agent_with_memory.invoke({"input": prompt}, config=config)
-                    output = response["output"]
+                    subquestions = split_compound_prompt(prompt)
+                    if len(subquestions) > 1 and can_answer_in_parallel(subquestions):
+                        # Subperguntas independentes são enviadas em paralelo ao
+                        # modelo, em vez de uma única chamada monolítica. As
+                        # demais seguem inteiras pelo caminho serial abaixo.
+                        history = get_session_history(st.session_state.session_id)
+                        responses = asyncio.run(agent_with_memory.abatch(
+                            [{"input": question} for question in subquestions],
+                            config=config,
+                        ))
+                        # Cada execução grava sua troca no histórico ao terminar;
+                        # as trocas são reordenadas na ordem das subperguntas.
+                        exchanges = []
+                        for question, response in zip(subquestions, responses):
+                            exchanges += [HumanMessage(content=question), AIMessage(content=response["output"])]
+                        history.messages = history.messages[:-len(exchanges)] + exchanges
+                        output = "\n\n".join(
+                            f"### {question}\n\n{response['output']}"
+                            for question, response in zip(subquestions, responses)
+                        )
+                        st.markdown(output)
+                    else:
+                        # A resposta é exibida conforme é gerada, em um espaço
+                        # reservado que pode ser reescrito ao final da execução.
+                        # Não há ganho em usar asyncio.run(ainvoke(...)): cada sessão
+                        # do Streamlit roda seu script em uma thread própria e a
+                        # espera pela API libera o GIL, então outras sessões não
+                        # ficam bloqueadas. Além disso, asyncio.run também bloquearia
+                        # esta thread até o fim, e ainvoke só devolveria a resposta
+                        # completa, sem os tokens transmitidos por stream_agent_output.
+                        result = {}
+                        placeholder = st.empty()
+                        streamed = placeholder.write_stream(
+                            stream_agent_output(agent_with_memory, prompt, config, result)
+                        )
+                        output = result["output"]
+                        # Os tokens são transmitidos a partir de qualquer chamada ao
+                        # LLM que chegue ao marcador, inclusive uma que o agente
+                        # descarta depois (ex.: erro de parsing seguido de nova
+                        # tentativa). Nesse caso, a resposta exibida é substituída
+                        # pela saída real, que é a mesma gravada no histórico do agente.
+                        if streamed.strip() != output.strip():
+                            placeholder.markdown(output)
 
-                    # Captura a figura gerada pelo Matplotlib, se houver.
+                    # Captura a figura gerada pelo Matplotlib, se houver, após o
+                    # término do streaming (quando todo o código já foi executado).
                     # fig.get_axes() retorna True se a figura contiver algum eixo (plot).
                     fig = plt.gcf()
+                    # A figura é desregistrada do pyplot; apenas o PNG é mantido no
+                    # histórico, então o objeto Figure pode ser coletado.
+                    plt.close(fig)
                     if fig.get_axes():
-                        st.pyplot(fig)
-                        # Anexa o gráfico à mensagem para ser re-renderizado corretamente.
-                        ai_message = AIMessage(content=output, additional_kwargs={"plot": fig})
+                        plot_png = figure_to_png(fig)
+                        st.image(plot_png)
+                        # Anexa o gráfico (como PNG) à mensagem para ser re-renderizado corretamente.
+                        ai_message = AIMessage(content=output, additional_kwargs={"plot_png": plot_png})
                     else:
-                        st.markdown(output)
                         ai_message = AIMessage(content=output)
 
                     st.session_state.messages.append(ai_message)
+                    save_session_history(st.session_state.session_id)
+                    schedule_history_compaction(st.session_state.session_id)
 
                 except Exception as e:
                     error_message = f"Ocorreu um erro durante a análise: {str(e)}"
@@ -313,16 +1070,18 @@ def main():
         st.info("Aguardando o carregamento de um arquivo CSV...")
         return
 
-    # Exibe o histórico do chat na interface a cada nova interação.
-    for message in st.session_state.messages:
-        with st.chat_message(message.type):
-            st.markdown(message.content)
-            # Se a mensagem da IA tiver um gráfico associado, exibe-o.
-            if "plot" in message.additional_kwargs:
-                st.pyplot(message.additional_kwargs["plot"])
-
-    # Carrega os dados do CSV. A função é cacheada para eficiência.
-    df = load_csv(uploaded_file)
+    # Carrega os dados do CSV e inicializa o LLM em paralelo, pois são operações
+    # independentes. Ambas as funções são cacheadas, então só a primeira execução
+    # se beneficia. As threads recebem o contexto do Streamlit para que possam
+    # usar a sessão e exibir mensagens de erro.
+    with ThreadPoolExecutor(
+        max_workers=2,
+        initializer=add_script_run_ctx,
+        initargs=(None, get_script_run_ctx()),
+    ) as executor:
+        df_future = executor.submit(load_csv, uploaded_file)
+        llm_future = executor.submit(get_llm, google_api_key)
+    df = df_future.result()
 
     if df is not None:
         # Exibe uma prévia dos dados apenas uma vez por arquivo carregado.
@@ -330,14 +1089,30 @@ def main():
             st.success("Arquivo CSV carregado com sucesso! Amostra dos dados:")
             st.dataframe(df.head())
             st.session_state.df_loaded = True
+        else:
+            # Exibe o histórico do chat na interface a cada nova interação. No
+            # primeiro carregamento do arquivo ainda não há mensagens a exibir.
+            for message in st.session_state.messages:
+                with st.chat_message(message.type):
+                    st.markdown(message.content)
+                    # Se a mensagem da IA tiver um gráfico associado, exibe-o.
+                    if "plot_png" in message.additional_kwargs:
+                        st.image(message.additional_kwargs["plot_png"])
 
         try:
-            # Inicializa o LLM e o agente de análise.
-            llm = get_llm(google_api_key)
-            agent_with_memory = initialize_agent(llm, df)
+            # Obtém o LLM e inicializa o agente de análise.
+            llm = llm_future.result()
+            # O SHA-1 do conteúdo identifica o arquivo: um novo CSV gera um novo
+            # agente, e reenviar o mesmo arquivo na mesma sessão reaproveita o
+            # que já foi criado. Cada sessão tem seu próprio agente. Arquivos
+            # grandes são entregues ao agente como uma amostra aleatória; a
+            # prévia e as respostas locais continuam usando o arquivo completo.
+            agent_with_memory = initialize_agent(
+                llm, df, file_sha1(uploaded_file), st.session_state.session_id
+            )
             
             # Processa a interação do chat.
-            handle_chat_interaction(agent_with_memory)
+            handle_chat_interaction(agent_with_memory, df)
 
         except Exception as e:
             st.error(f"Ocorreu um erro crítico ao inicializar o agente: {e}")
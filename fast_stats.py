@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Estatísticas numéricas compiladas com Numba para uso pelo agente.
+
+As funções públicas recebem colunas (pd.Series) ou DataFrames do Pandas,
+convertem os dados para arrays NumPy contíguos de float64 (valores ausentes
+viram NaN) e delegam o cálculo a kernels JIT paralelos. O agente pode
+importá-las no `python_repl_ast` com `import fast_stats`.
+"""
+
+import numba
+import numpy as np
+import pandas as pd
+
+# Flags de fastmath sem "nnan"/"ninf": os kernels usam np.isnan para ignorar
+# valores ausentes, e essas flags permitiriam ao compilador eliminar o teste.
+FASTMATH_FLAGS = {"nsz", "arcp", "contract", "afn", "reassoc"}
+
+DESCRIBE_LABELS = ["count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+
+# ==============================================================================
+# KERNELS NUMBA
+# ==============================================================================
+
+@numba.njit(cache=True)
+def _sorted_quantile(sorted_arr, q):
+    """Quantil com interpolação linear (mesmo critério do Pandas) de um array ordenado."""
+    position = q * (sorted_arr.shape[0] - 1)
+    lower = int(np.floor(position))
+    upper = min(lower + 1, sorted_arr.shape[0] - 1)
+    return sorted_arr[lower] + (sorted_arr[upper] - sorted_arr[lower]) * (position - lower)
+
+@numba.njit(parallel=True, cache=True, fastmath=FASTMATH_FLAGS)
+def _iqr_outliers_kernel(arr):
+    mask = np.zeros(arr.shape[0], dtype=np.bool_)
+    valid = np.sort(arr[~np.isnan(arr)])
+    if valid.shape[0] == 0:
+        return mask
+    q1 = _sorted_quantile(valid, 0.25)
+    q3 = _sorted_quantile(valid, 0.75)
+    iqr = q3 - q1
+    lower = q1 - 1.5 * iqr
+    upper = q3 + 1.5 * iqr
+    # Comparações com NaN são falsas, então valores ausentes nunca são outliers.
+    for i in numba.prange(arr.shape[0]):
+        mask[i] = arr[i] < lower or arr[i] > upper
+    return mask
+
+@numba.njit(parallel=True, cache=True, fastmath=FASTMATH_FLAGS)
+def _describe_kernel(arr):
+    result = np.full(8, np.nan)
+    valid = np.sort(arr[~np.isnan(arr)])
+    n = valid.shape[0]
+    result[0] = n
+    if n == 0:
+        return result
+
+    total = 0.0
+    for i in numba.prange(n):
+        total += valid[i]
+    mean = total / n
+
+    squares = 0.0
+    for i in numba.prange(n):
+        squares += (valid[i] - mean) ** 2
+
+    result[1] = mean
+    # Desvio padrão amostral (ddof=1), como em df.describe().
+    if n > 1:
+        result[2] = np.sqrt(squares / (n - 1))
+    result[3] = valid[0]
+    result[4] = _sorted_quantile(valid, 0.25)
+    result[5] = _sorted_quantile(valid, 0.50)
+    result[6] = _sorted_quantile(valid, 0.75)
+    result[7] = valid[n - 1]
+    return result
+
+@numba.njit(parallel=True, cache=True, fastmath=FASTMATH_FLAGS)
+def _pairwise_corr_kernel(columns):
+    # `columns` tem formato (n_colunas, n_linhas): cada coluna é contígua na memória.
+    n_cols, n_rows = columns.shape
+    result = np.full((n_cols, n_cols), np.nan)
+    for i in numba.prange(n_cols):
+        for j in range(i, n_cols):
+            # Correlação de Pearson usando apenas as linhas sem NaN em ambas as
+            # colunas, como em df.corr().
+            count = 0
+            sum_x = 0.0
+            sum_y = 0.0
+            for r in range(n_rows):
+                x = columns[i, r]
+                y = columns[j, r]
+                if not (np.isnan(x) or np.isnan(y)):
+                    count += 1
+                    sum_x += x
+                    sum_y += y
+            if count < 2:
+                continue
+            mean_x = sum_x / count
+            mean_y = sum_y / count
+
+            sxx = 0.0
+            syy = 0.0
+            sxy = 0.0
+            for r in range(n_rows):
+                x = columns[i, r]
+                y = columns[j, r]
+                if not (np.isnan(x) or np.isnan(y)):
+                    dx = x - mean_x
+                    dy = y - mean_y
+                    sxx += dx * dx
+                    syy += dy * dy
+                    sxy += dx * dy
+            denominator = np.sqrt(sxx * syy)
+            if denominator > 0:
+                result[i, j] = sxy / denominator
+                result[j, i] = sxy / denominator
+    return result
+
+# ==============================================================================
+# FUNÇÕES PÚBLICAS
+# ==============================================================================
+
+def _to_float_array(values):
+    """Converte uma coluna em array NumPy contíguo de float64, com NaN nos ausentes."""
+    series = pd.Series(values)
+    return np.ascontiguousarray(series.to_numpy(dtype="float64", na_value=np.nan))
+
+def iqr_outliers(values):
+    """
+    Identifica outliers pelo critério do intervalo interquartil (IQR).
+
+    Args:
+        values (pd.Series): A coluna numérica a ser analisada.
+
+    Returns:
+        np.ndarray: Máscara booleana, True para valores abaixo de Q1 - 1.5*IQR
+        ou acima de Q3 + 1.5*IQR. Pode ser usada diretamente em `df[máscara]`.
+    """
+    return _iqr_outliers_kernel(_to_float_array(values))
+
+def describe_fast(values):
+    """
+    Calcula as estatísticas descritivas básicas de uma coluna numérica.
+
+    Args:
+        values (pd.Series): A coluna numérica a ser analisada.
+
+    Returns:
+        pd.Series: count, mean, std, min, 25%, 50%, 75% e max, como em `describe()`.
+    """
+    return pd.Series(_describe_kernel(_to_float_array(values)), index=DESCRIBE_LABELS)
+
+def pairwise_corr(df):
+    """
+    Calcula a matriz de correlação de Pearson entre as colunas numéricas.
+
+    Args:
+        df (pd.DataFrame): O DataFrame a ser analisado.
+
+    Returns:
+        pd.DataFrame: A matriz de correlação, como em `df.corr()`.
+    """
+    numeric = df.select_dtypes("number")
+    matrix = numeric.to_numpy(dtype="float64", na_value=np.nan)
+    columns = np.ascontiguousarray(matrix.T)
+    return pd.DataFrame(
+        _pairwise_corr_kernel(columns),
+        index=numeric.columns,
+        columns=numeric.columns,
+    )
+
+def warmup():
+    """
+    Executa todos os kernels com um array pequeno para disparar a compilação
+    JIT antecipadamente, evitando que o usuário espere por ela na primeira análise.
+    """
+    sample = np.arange(8, dtype=np.float64)
+    _iqr_outliers_kernel(sample)
+    _describe_kernel(sample)
+    _pairwise_corr_kernel(np.ascontiguousarray(np.vstack((sample, sample[::-1]))))